@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import socket
+import argparse
+
+
+#thin client for analysis_daemon.py - only uses the standard library so it starts instantly
+#sends one request and prints the daemon's progress as it streams back
+
+daemon_host = "127.0.0.1"
+daemon_port = 50517
+
+def send_request(request, host=daemon_host, port=daemon_port, on_line=print):
+    with socket.create_connection((host, port)) as sock:
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as stream:
+            for message in stream:
+                message = json.loads(message)
+                if message["type"] == "log":
+                    on_line(message["line"])
+                elif message["type"] == "done":
+                    return message
+    return {"type": "done", "ok": False, "error": "connection closed by daemon"}
+
+def main():
+    parser = argparse.ArgumentParser(description="Submit work to a running analysis daemon.")
+    parser.add_argument("--host", default=daemon_host)
+    parser.add_argument("--port", type=int, default=daemon_port)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    analyze = commands.add_parser("analyze", help="run the integrated analysis on folders or files")
+    analyze.add_argument("paths", nargs="+")
+    analyze.add_argument("--output-folder", help="where results go when files are given (default: their common folder)")
+    analyze.add_argument("--video-frame-step", type=int, default=1)
+    analyze.add_argument("--video-seek", action="store_true")
+
+    rename = commands.add_parser("rename", help="OCR serials and rename photo groups in a folder")
+    rename.add_argument("folder")
+    rename.add_argument("--undo", action="store_true", help="restore the original names from the folder's journal")
+
+    commands.add_parser("ping", help="check that the daemon is up")
+    commands.add_parser("shutdown", help="stop the daemon")
+
+    args = parser.parse_args()
+
+    request = {"command": args.command}
+    if args.command == "analyze":
+        request["paths"] = [os.path.abspath(p) for p in args.paths]
+        request["output_folder"] = os.path.abspath(args.output_folder) if args.output_folder else None
+        request["video_frame_step"] = args.video_frame_step
+        request["video_seek"] = args.video_seek
+    elif args.command == "rename":
+        request["folder"] = os.path.abspath(args.folder)
+        request["undo"] = args.undo
+
+    try:
+        result = send_request(request, args.host, args.port)
+    except ConnectionRefusedError:
+        print(f"No analysis daemon on {args.host}:{args.port}. Start one with: python analysis_daemon.py")
+        sys.exit(2)
+
+    if not result["ok"]:
+        print(f"Error: {result.get('error')}")
+        sys.exit(1)
+    if "seconds" in result:
+        print(f"Done in {result['seconds']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
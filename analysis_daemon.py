@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import argparse
+import threading
+import traceback
+import contextlib
+import socketserver
+
+#import the heavy modules once at startup so every request after that is warm
+import cv2
+import numpy as np
+
+import naming_photos
+from integrated_image_analysis_v1 import run_integrated_analysis
+from analysis_client import daemon_host, daemon_port
+
+
+#long-lived local analysis service - keeps cv2/NumPy/easyocr imported and the OCR model loaded
+#between requests. talk to it with analysis_client.py
+#protocol: one JSON request line in, JSON lines back ({"type": "log"} ... then one {"type": "done"})
+
+#analyses print their progress and share module state, so requests run one at a time
+job_lock = threading.Lock()
+
+#file-like object that forwards every printed line to the client as it happens
+class LineStream:
+    def __init__(self, send):
+        self.send = send
+        self.pending = ""
+
+    def write(self, text):
+        self.pending += text
+        while "\n" in self.pending:
+            line, self.pending = self.pending.split("\n", 1)
+            self.send({"type": "log", "line": line})
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            self.send({"type": "log", "line": self.pending})
+            self.pending = ""
+
+def run_analyze(request):
+    paths = request["paths"]
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"Not found: {', '.join(missing)}")
+
+    folders = [p for p in paths if os.path.isdir(p)]
+    files = [p for p in paths if not os.path.isdir(p)]
+    frame_step = request.get("video_frame_step", 1)
+    seek = request.get("video_seek", False)
+
+    for folder in folders:
+        run_integrated_analysis(folder, frame_step, seek)
+    if files:
+        output_folder = request.get("output_folder") or os.path.commonpath([os.path.dirname(f) for f in files])
+        run_integrated_analysis(output_folder, frame_step, seek, file_paths=files)
+
+def run_rename(request):
+    if request.get("undo"):
+        naming_photos.undo_image_groups(request["folder"])
+    else:
+        naming_photos.process_image_groups(request["folder"])
+
+commands = {
+    "analyze": run_analyze,
+    "rename": run_rename,
+    "ping": lambda request: None
+}
+
+class AnalysisRequestHandler(socketserver.StreamRequestHandler):
+    def send(self, message):
+        self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        start = time.perf_counter()
+        try:
+            request = json.loads(line)
+            command = request.get("command")
+
+            if command == "shutdown":
+                self.send({"type": "done", "ok": True})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            if command not in commands:
+                raise ValueError(f"Unknown command: {command}")
+
+            with job_lock:
+                stream = LineStream(self.send)
+                with contextlib.redirect_stdout(stream):
+                    commands[command](request)
+                stream.flush()
+        except Exception as e:
+            traceback.print_exc()
+            self.send({"type": "done", "ok": False, "error": f"{type(e).__name__}: {e}"})
+            return
+
+        self.send({"type": "done", "ok": True, "seconds": time.perf_counter() - start})
+
+class AnalysisDaemon(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+def serve(host=daemon_host, port=daemon_port, preload_ocr=True):
+    if preload_ocr:
+        print("Loading OCR model...")
+        naming_photos.get_reader()
+
+    with AnalysisDaemon((host, port), AnalysisRequestHandler) as server:
+        print(f"Analysis daemon listening on {host}:{port} (OpenCV {cv2.__version__}, NumPy {np.__version__})")
+        server.serve_forever()
+    print("Analysis daemon stopped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the cartridge analyses warm behind a local socket.")
+    parser.add_argument("--host", default=daemon_host)
+    parser.add_argument("--port", type=int, default=daemon_port)
+    parser.add_argument("--no-preload-ocr", action="store_true",
+                        help="load the OCR model on the first rename instead of at startup")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, preload_ocr=not args.no_preload_ocr)
@@ -0,0 +1,243 @@
+import os
+import csv
+import time
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from coin_position_analysis import process_coin_position_images
+from laminate_position_analysis import process_laminate_images
+from pmps_analysis import process_pmps_images
+from wax_melt_analysis import process_wax_melt_images
+from buffer_analysis_pre import process_pre_buffer_images
+from buffer_analysis_post import process_post_buffer_images
+from shared_frame_ring import run_shared_frame_stage
+
+
+#adaptive scheduler for the integrated runner. OpenCV already multithreads inside each call, and the
+#per-image work is small ROIs plus Python, so the best split between worker processes and
+#cv2.setNumThreads differs per stage and per PC. each stage times its first few images at a few
+#thread counts (those images are real work, not thrown away), then picks processes x threads for the rest.
+
+#stage name: (process function, CSV it writes, histogram file it writes or None)
+stages = {
+    "coin_position": (process_coin_position_images, "coin_positions.csv", None),
+    "laminate": (process_laminate_images, "laminate_position.csv", None),
+    "pmps": (process_pmps_images, "pmp_analysis.csv", "pmp_histograms.npz"),
+    "wax_melt": (process_wax_melt_images, "wax_analysis.csv", "wax_histograms.npz"),
+    "pre_buffer": (process_pre_buffer_images, "pre_buffer_levels.csv", None),
+    "post_buffer": (process_post_buffer_images, "post_buffer_levels.csv", None)
+}
+
+#below this many images a stage just runs serially - calibrating would cost more than it saves
+min_images_to_schedule = 12
+#parts per worker process, so a slow part doesn't leave the other workers idle at the end
+parts_per_process = 4
+
+#always spawn workers - forking a process after OpenCV has started its thread pool can hang or crash it,
+#and it's what Windows does anyway
+mp_context = multiprocessing.get_context("spawn")
+
+#measured once per Python process, then reused (the analysis daemon only pays it once)
+pool_startup_s = None
+
+def thread_options():
+    cpu = os.cpu_count() or 1
+    return sorted({1, min(2, cpu), max(cpu // 2, 1), cpu})
+
+def run_part(stage_name, image_paths, input_folder, csv_path, histogram_path):
+    process_func, _, histogram_name = stages[stage_name]
+    if histogram_name:
+        process_func(image_paths, input_folder, csv_path=csv_path, histogram_path=histogram_path)
+    else:
+        process_func(image_paths, input_folder, csv_path=csv_path)
+    return len(image_paths)
+
+def init_worker(n_threads):
+    cv2.setNumThreads(n_threads)
+
+def warm_worker():
+    return os.getpid()
+
+#time to start a worker process and import the analysis modules in it
+def measure_pool_startup():
+    global pool_startup_s
+    if pool_startup_s is None:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp_context, initializer=init_worker, initargs=(1,)) as pool:
+            pool.submit(warm_worker).result()
+        pool_startup_s = time.perf_counter() - start
+    return pool_startup_s
+
+#combine part CSVs in order, keeping one header
+#filename_order: {filename: position} to put rows back in image order when parts hold arbitrary subsets
+def merge_csv_parts(part_paths, csv_path, filename_order=None):
+    header = None
+    rows = []
+    for part_path in part_paths:
+        if not os.path.exists(part_path):
+            continue
+        with open(part_path, newline="") as f:
+            part_rows = list(csv.reader(f))
+        if not part_rows:
+            continue
+        header = header or part_rows[0]
+        rows.extend(part_rows[1:])
+
+    if filename_order is not None:
+        rows.sort(key=lambda row: filename_order.get(row[0], len(filename_order)))
+
+    with open(csv_path, "w", newline="") as out:
+        writer = csv.writer(out)
+        if header:
+            writer.writerow(header)
+        writer.writerows(rows)
+
+def merge_npz_parts(part_paths, npz_path, filename_order=None):
+    parts = [np.load(p) for p in part_paths if os.path.exists(p)]
+    if not parts:
+        return
+    merged = {key: np.concatenate([part[key] for part in parts]) for key in parts[0].files}
+    if filename_order is not None:
+        order = np.argsort([filename_order.get(f, len(filename_order)) for f in merged["filenames"]], kind="stable")
+        merged = {key: value[order] for key, value in merged.items()}
+    np.savez_compressed(npz_path, **merged)
+
+#pick processes x threads with the lowest estimated time for the remaining images
+def choose_plan(seconds_per_image, n_remaining, startup_s):
+    cpu = os.cpu_count() or 1
+    best = None
+    for n_threads, per_image in seconds_per_image.items():
+        n_processes = max(1, min(cpu // n_threads, n_remaining))
+        candidates = [(n_remaining * per_image, 1)]
+        if n_processes > 1:
+            candidates.append((startup_s + n_remaining * per_image / n_processes, n_processes))
+        for estimate, processes in candidates:
+            if best is None or estimate < best[0]:
+                best = (estimate, processes, n_threads)
+    return best
+
+#shared_frames: parallel parts get their images from one decoder process through a shared memory
+#ring (shared_frame_ring) instead of each worker reading its own files
+def run_stage(stage_name, image_paths, input_folder, shared_frames=True):
+    process_func, csv_name, histogram_name = stages[stage_name]
+    n_images = len(image_paths)
+    default_threads = cv2.getNumThreads()
+    start = time.perf_counter()
+    plan = {"stage": stage_name, "images": n_images, "processes": 1, "threads": default_threads,
+            "calibration": {}, "estimated_images_per_s": None}
+
+    if n_images < min_images_to_schedule:
+        run_part(stage_name, image_paths, input_folder, None, None)
+        plan["seconds"] = time.perf_counter() - start
+        plan["images_per_s"] = n_images / plan["seconds"] if plan["seconds"] > 0 else 0
+        return plan
+
+    part_dir = tempfile.mkdtemp(prefix=f"{stage_name}_parts_")
+    part_paths = []
+    filename_order = None
+
+    def part_outputs(index):
+        csv_part = os.path.join(part_dir, f"part{index:04d}.csv")
+        npz_part = os.path.join(part_dir, f"part{index:04d}.npz") if histogram_name else None
+        part_paths.append((csv_part, npz_part))
+        return csv_part, npz_part
+
+    try:
+        #first image warms up OpenCV (lazy init, allocations) so it doesn't skew the timings
+        run_part(stage_name, image_paths[:1], input_folder, *part_outputs(0))
+        position = 1
+
+        #time each thread count on real images
+        options = thread_options()
+        per_option = 2 if n_images >= min_images_to_schedule + 2 * len(options) else 1
+        for n_threads in options:
+            batch = image_paths[position:position + per_option]
+            if not batch:
+                break
+            cv2.setNumThreads(n_threads)
+            t0 = time.perf_counter()
+            run_part(stage_name, batch, input_folder, *part_outputs(len(part_paths)))
+            plan["calibration"][n_threads] = (time.perf_counter() - t0) / len(batch)
+            position += len(batch)
+
+        remaining = image_paths[position:]
+        if remaining:
+            startup_s = measure_pool_startup() if (os.cpu_count() or 1) > 1 else 0
+            estimate, n_processes, n_threads = choose_plan(plan["calibration"], len(remaining), startup_s)
+            plan["processes"], plan["threads"] = n_processes, n_threads
+            plan["estimated_images_per_s"] = len(remaining) / estimate if estimate > 0 else None
+
+            if n_processes == 1:
+                cv2.setNumThreads(n_threads)
+                run_part(stage_name, remaining, input_folder, *part_outputs(len(part_paths)))
+            elif shared_frames:
+                worker_kwargs = []
+                for _ in range(n_processes):
+                    csv_part, npz_part = part_outputs(len(part_paths))
+                    kwargs = {"csv_path": csv_part}
+                    if histogram_name:
+                        kwargs["histogram_path"] = npz_part
+                    worker_kwargs.append(kwargs)
+                run_shared_frame_stage(process_func, remaining, input_folder, worker_kwargs, n_threads=n_threads)
+                #workers took frames as they came, so rows go back into image order
+                filename_order = {}
+                for i, path in enumerate(image_paths):
+                    filename_order.setdefault(os.path.basename(path), i)
+            else:
+                n_parts = min(len(remaining), n_processes * parts_per_process)
+                bounds = np.linspace(0, len(remaining), n_parts + 1).astype(int)
+                with ProcessPoolExecutor(max_workers=n_processes, mp_context=mp_context, initializer=init_worker,
+                                         initargs=(n_threads,)) as pool:
+                    futures = [
+                        pool.submit(run_part, stage_name, remaining[a:b], input_folder,
+                                    *part_outputs(len(part_paths)))
+                        for a, b in zip(bounds[:-1], bounds[1:])
+                    ]
+                    for future in futures:
+                        future.result()
+
+        merge_csv_parts([c for c, _ in part_paths], os.path.join(input_folder, csv_name), filename_order)
+        if histogram_name:
+            merge_npz_parts([n for _, n in part_paths], os.path.join(input_folder, histogram_name), filename_order)
+        print(f"{stage_name}: {len(part_paths)} parts merged into {os.path.join(input_folder, csv_name)}")
+    finally:
+        cv2.setNumThreads(default_threads)
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    plan["seconds"] = time.perf_counter() - start
+    plan["images_per_s"] = n_images / plan["seconds"] if plan["seconds"] > 0 else 0
+    return plan
+
+#stage_jobs: list of (stage name, image paths). runs them in order, returns and saves the chosen plans
+def run_scheduled_stages(stage_jobs, input_folder, shared_frames=True):
+    plans = []
+    for stage_name, image_paths in stage_jobs:
+        if image_paths:
+            plans.append(run_stage(stage_name, image_paths, input_folder, shared_frames))
+
+    if not plans:
+        return plans
+
+    schedule_path = os.path.join(input_folder, "analysis_schedule.csv")
+    with open(schedule_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["stage", "images", "processes", "cv2_threads",
+                         "calibration_s_per_image", "estimated_images_per_s", "images_per_s", "seconds"])
+        for plan in plans:
+            calibration = "; ".join(f"{t} threads: {s:.3f}" for t, s in plan["calibration"].items())
+            estimate = plan["estimated_images_per_s"]
+            writer.writerow([plan["stage"], plan["images"], plan["processes"], plan["threads"], calibration,
+                             f"{estimate:.2f}" if estimate else "", f"{plan['images_per_s']:.2f}",
+                             f"{plan['seconds']:.2f}"])
+
+    print("\nSchedule:")
+    for plan in plans:
+        print(f"  {plan['stage']}: {plan['images']} images, {plan['processes']} process(es) x "
+              f"{plan['threads']} cv2 thread(s), {plan['images_per_s']:.2f} images/s")
+    print(f"Schedule saved to: {schedule_path}")
+    return plans
@@ -0,0 +1,139 @@
+import cv2
+import os
+import csv
+
+from buffer_analysis_pre import measure_pre_buffer_levels
+from buffer_analysis_post import measure_post_buffer_levels
+from pmps_analysis import analyze_pmps_frame
+from wax_melt_analysis import measure_wax_melt
+
+
+#streams frames out of cartridge run videos and runs the buffer level / PMPS / wax analyses on them
+#frame by frame, without exporting stills to disk. one time series CSV per video per analysis.
+
+#CSV columns for each analysis (after filename, frame_index, time_s)
+timeseries_columns = {
+    "pre_buffer_levels": (
+        "liquid_y",
+        "feature_top_y", "feature_bottom_y", "feature_height_px",
+        "delta_y", "delta_mm"
+    ),
+    "post_buffer_levels": (
+        "C2_liquid_y", "C1_liquid_y",
+        "feature_top_y", "feature_bottom_y", "feature_height_px",
+        "C2_height", "C2_height_mm",
+        "C1_height", "C1_height_mm"
+    ),
+    "pmp_analysis": (
+        "Chamber center X", "Chamber center Y", "Chamber radius", "Chamber detected?",
+        "Total chamber area (px)",
+        "PMPs in chamber (px)",
+        "Percent PMP in chamber area",
+        "Percent total PMP area"
+    ),
+    "wax_analysis": (
+        "rect1_white_percent", "rect1_dark_percent",
+        "rect2_white_percent", "rect2_dark_percent",
+        "total_white_percent", "total_dark_percent"
+    )
+}
+
+def wax_timeseries_row(frame):
+    wax = measure_wax_melt(frame)
+    if wax is None:
+        return None
+    w1, d1 = wax["rect1_percent"]
+    w2, d2 = wax["rect2_percent"]
+    return (
+        f"{w1:.2f}", f"{d1:.2f}",
+        f"{w2:.2f}", f"{d2:.2f}",
+        f"{w1 + w2:.2f}", f"{d1 + d2:.2f}"
+    )
+
+#which analyses run on which category of video - same categories as the still photos
+#each function takes a BGR frame and returns the CSV values, or None to skip the frame
+#pmps draws its annotations on the frame, so it runs last
+video_analyses = {
+    "pre_buffers": [("pre_buffer_levels", measure_pre_buffer_levels)],
+    "post_buffers": [("post_buffer_levels", measure_post_buffer_levels)],
+    "post_coins": [
+        ("wax_analysis", wax_timeseries_row),
+        ("pmp_analysis", lambda frame: analyze_pmps_frame(frame)["row"])
+    ]
+}
+
+#yields (frame_index, time_s, frame) for every frame_step-th frame of the video
+#seek=True jumps straight to each sampled frame (fast for big steps, relies on the container's keyframe index)
+#seek=False grabs every frame but only decodes the sampled ones (safe for any codec)
+def iter_video_frames(video_path, frame_step=1, seek=False):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Warning: Could not open {os.path.basename(video_path)}. Skipping.")
+        return
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    frame_index = 0
+    try:
+        while True:
+            if seek and frame_step > 1 and frame_index > 0:
+                if frame_count and frame_index >= frame_count:
+                    break
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ok, frame = cap.read()
+            if not ok:
+                break
+
+            time_s = frame_index / fps if fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            yield frame_index, time_s, frame
+
+            if not seek:
+                #skip to the next sampled frame without decoding the ones in between
+                for _ in range(frame_step - 1):
+                    if not cap.grab():
+                        return
+            frame_index += frame_step
+    finally:
+        cap.release()
+
+def process_video_frames(video_path, category, output_folder, frame_step=1, seek=False):
+    analyses = video_analyses[category]
+    video_name = os.path.basename(video_path)
+    stem = os.path.splitext(video_name)[0]
+
+    files = {}
+    writers = {}
+    for name, _ in analyses:
+        csv_path = os.path.join(output_folder, f"{stem}_{name}.csv")
+        files[name] = open(csv_path, mode="w", newline="")
+        writers[name] = csv.writer(files[name])
+        writers[name].writerow(("filename", "frame_index", "time_s") + timeseries_columns[name])
+
+    frames_analyzed = 0
+    try:
+        for frame_index, time_s, frame in iter_video_frames(video_path, frame_step, seek):
+            for name, analyze in analyses:
+                values = analyze(frame)
+                if values is None:
+                    continue
+                writers[name].writerow((video_name, frame_index, f"{time_s:.3f}") + tuple(values))
+            frames_analyzed += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    print(f"{video_name} - {frames_analyzed} frames analyzed ({category})")
+    return frames_analyzed
+
+def process_cartridge_videos(video_paths, category, input_folder, frame_step=1, seek=False):
+    if not video_paths:
+        print(f"No videos provided for {category} analysis.")
+        return
+
+    output_folder = os.path.join(input_folder, "video_timeseries")
+    os.makedirs(output_folder, exist_ok=True)
+
+    for video_path in video_paths:
+        process_video_frames(video_path, category, output_folder, frame_step, seek)
+
+    print(f"\nVideo analysis ({category}) done! Time series saved in: {output_folder}")
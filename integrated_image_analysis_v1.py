@@ -1,52 +1,119 @@
-import os
-#import sys
-
-#sys.path.insert(0, os.path.abspath("/Users/natalie/projects/integrated_image_analysis"))
-
-# === SET YOUR INPUT DIRECTORY HERE ===
-input_folder = "//nuc-fs1/Engineering/Grant/DASH/General Cartridge Run Videos/QC testing cartridge pics/RDCE_NEG_23JUL25"
-
-# === CATEGORIZE IMAGES ===
-images = {
-    "pre_coins": [],
-    "post_coins": [],
-    "pre_buffers": [],
-    "post_buffers": []
-}
-
-# Categorize based on keywords in filenames or folder names
-for root, dirs, files in os.walk(input_folder):
-    for file in files:
-        if not file.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".tiff")):
-            continue
-        fpath = os.path.join(root, file)
-        lower_path = fpath.lower()
-
-        if "pre coins" in lower_path:
-            images["pre_coins"].append(fpath)
-        elif "post coins" in lower_path:
-            images["post_coins"].append(fpath)
-        elif "pre buffers" in lower_path:
-            images["pre_buffers"].append(fpath)
-        elif "post buffers" in lower_path:
-            images["post_buffers"].append(fpath)
-
-# === ANALYSIS FUNCTIONS ===
-from coin_position_analysis import process_coin_position_images
-from laminate_position_analysis import process_laminate_images
-from pmps_analysis import process_pmps_images
-from wax_melt_analysis import process_wax_melt_images
-from buffer_analysis_pre import process_pre_buffer_images
-from buffer_analysis_post import process_post_buffer_images
-
-# === RUN ANALYSES ON GROUPED IMAGES ===
-if images["pre_coins"]:
-    process_coin_position_images(images["pre_coins"], input_folder)
-    process_laminate_images(images["pre_coins"], input_folder)
-if images["post_coins"]:
-    process_pmps_images(images["post_coins"], input_folder)
-    process_wax_melt_images(images["post_coins"], input_folder)
-if images["pre_buffers"]:
-    process_pre_buffer_images(images["pre_buffers"], input_folder)
-if images["post_buffers"]:
-    process_post_buffer_images(images["post_buffers"], input_folder)
+import os
+import argparse
+#import sys
+
+#sys.path.insert(0, os.path.abspath("/Users/natalie/projects/integrated_image_analysis"))
+
+# === SET YOUR INPUT DIRECTORY HERE ===
+input_folder = "//nuc-fs1/Engineering/Grant/DASH/General Cartridge Run Videos/QC testing cartridge pics/RDCE_NEG_23JUL25"
+
+image_extensions = (".jpg", ".jpeg", ".png", ".bmp", ".tiff")
+video_extensions = (".mp4", ".mov", ".avi", ".mkv", ".m4v")
+
+# === CATEGORIZE IMAGES ===
+# Categorize based on keywords in filenames or folder names
+def categorize_path(fpath):
+    lower_path = fpath.lower()
+    if "pre coins" in lower_path:
+        return "pre_coins"
+    elif "post coins" in lower_path:
+        return "post_coins"
+    elif "pre buffers" in lower_path:
+        return "pre_buffers"
+    elif "post buffers" in lower_path:
+        return "post_buffers"
+    return None
+
+def categorize_file_list(file_paths):
+    images = {
+        "pre_coins": [],
+        "post_coins": [],
+        "pre_buffers": [],
+        "post_buffers": []
+    }
+    videos = {key: [] for key in images}
+
+    for fpath in file_paths:
+        file = os.path.basename(fpath)
+        if file.lower().endswith(image_extensions):
+            groups = images
+        elif file.lower().endswith(video_extensions):
+            groups = videos
+        else:
+            continue
+
+        category = categorize_path(fpath)
+        if category:
+            groups[category].append(fpath)
+
+    return images, videos
+
+def categorize_files(input_folder):
+    file_paths = []
+    for root, dirs, files in os.walk(input_folder):
+        for file in files:
+            file_paths.append(os.path.join(root, file))
+    return categorize_file_list(file_paths)
+
+#file_paths: analyze just these files (results still go to input_folder) instead of walking the folder
+#adaptive: let analysis_scheduler pick worker processes / OpenCV threads per stage, otherwise run serially
+def run_integrated_analysis(input_folder, video_frame_step=1, video_seek=False, file_paths=None, adaptive=True):
+    if file_paths is None:
+        images, videos = categorize_files(input_folder)
+    else:
+        images, videos = categorize_file_list(file_paths)
+
+    # === ANALYSIS FUNCTIONS ===
+    from coin_position_analysis import process_coin_position_images
+    from laminate_position_analysis import process_laminate_images
+    from pmps_analysis import process_pmps_images
+    from wax_melt_analysis import process_wax_melt_images
+    from buffer_analysis_pre import process_pre_buffer_images
+    from buffer_analysis_post import process_post_buffer_images
+    from cartridge_video_analysis import process_cartridge_videos, video_analyses
+    from analysis_scheduler import run_scheduled_stages
+
+    # === RUN ANALYSES ON GROUPED IMAGES ===
+    if adaptive:
+        run_scheduled_stages([
+            ("coin_position", images["pre_coins"]),
+            ("laminate", images["pre_coins"]),
+            ("pmps", images["post_coins"]),
+            ("wax_melt", images["post_coins"]),
+            ("pre_buffer", images["pre_buffers"]),
+            ("post_buffer", images["post_buffers"])
+        ], input_folder)
+    else:
+        if images["pre_coins"]:
+            process_coin_position_images(images["pre_coins"], input_folder)
+            process_laminate_images(images["pre_coins"], input_folder)
+        if images["post_coins"]:
+            process_pmps_images(images["post_coins"], input_folder)
+            process_wax_melt_images(images["post_coins"], input_folder)
+        if images["pre_buffers"]:
+            process_pre_buffer_images(images["pre_buffers"], input_folder)
+        if images["post_buffers"]:
+            process_post_buffer_images(images["post_buffers"], input_folder)
+
+    # === RUN ANALYSES ON CARTRIDGE RUN VIDEOS (frames streamed, no stills exported) ===
+    for category, video_paths in videos.items():
+        if not video_paths:
+            continue
+        if category not in video_analyses:
+            print(f"No video analysis for {category}, skipping {len(video_paths)} video(s).")
+            continue
+        process_cartridge_videos(video_paths, category, input_folder, video_frame_step, video_seek)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run all cartridge image analyses on a folder.")
+    parser.add_argument("folder", nargs="?", default=input_folder)
+    parser.add_argument("--video-frame-step", type=int, default=1,
+                        help="analyze every Nth frame of cartridge run videos")
+    parser.add_argument("--video-seek", action="store_true",
+                        help="seek to sampled video frames instead of grabbing through them")
+    parser.add_argument("--serial", action="store_true",
+                        help="run every analysis in this process instead of letting the scheduler split the work")
+    args = parser.parse_args()
+
+    run_integrated_analysis(args.folder, args.video_frame_step, args.video_seek, adaptive=not args.serial)
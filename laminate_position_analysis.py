@@ -1,142 +1,213 @@
-import cv2
-import numpy as np
-import os
-import csv
-
-def process_laminate_images(image_paths, base_folder):
-    if not image_paths:
-        print("No images provided for laminate analysis.")
-        return
-
-    output_folder = os.path.join(base_folder, "laminate_position")
-    csv_output_path = os.path.join(base_folder, "laminate_position.csv")
-    os.makedirs(output_folder, exist_ok=True)
-
-    rois = [
-        {"name": "ROI 1 - Horizontal", "left": 1300, "right": 1375, "top": 510, "bottom": 560, "orientation": "horizontal", "smooth": 9, "clahe": 4.5},
-        {"name": "ROI 2 - Horizontal", "left": 320, "right": 450, "top": 950, "bottom": 1010, "orientation": "horizontal", "smooth": 5, "clahe": 3.0},
-        {"name": "ROI 3 - Vertical", "left": 1100, "right": 1170, "top": 790, "bottom": 870, "orientation": "vertical", "smooth": 5, "clahe": 3.0},
-        {"name": "ROI 4 - Vertical", "left": 750, "right": 810, "top": 790, "bottom": 870, "orientation": "vertical", "smooth": 5, "clahe": 3.0}
-    ]
-
-    chamber_roi = {
-        "left": 1150, "right": 1450, "top": 550, "bottom": 800,
-        "min_radius": 85, "max_radius": 93
-    }
-
-    box_color = (255, 0, 0)
-    line_color = (0, 255, 255)
-    dot_color = (0, 0, 255)
-    chamber_color = (0, 255, 0)
-    center_marker_color = (0, 0, 255)
-
-    with open(csv_output_path, mode='w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        header = ["filename"]
-        for roi in rois:
-            header.append(f"{roi['name']} x")
-            header.append(f"{roi['name']} y")
-        header.extend([
-            "chamber_center_x", "chamber_center_y", "chamber_radius",
-            "pixels_per_mm",
-            "vertical_distance_px", "vertical_distance_mm",
-            "horizontal_distance_px", "horizontal_distance_mm"
-        ])
-        writer.writerow(header)
-
-        for image_path in image_paths:
-            filename = os.path.basename(image_path)
-            image = cv2.imread(image_path)
-            if image is None:
-                print(f"Could not load {filename}, skipping.")
-                continue
-
-            output = image.copy()
-            row = [filename]
-
-            for roi in rois:
-                LEFT, RIGHT, TOP, BOTTOM = roi["left"], roi["right"], roi["top"], roi["bottom"]
-                gray = cv2.cvtColor(image[TOP:BOTTOM, LEFT:RIGHT], cv2.COLOR_BGR2GRAY)
-
-                bilateral = cv2.bilateralFilter(gray, 9, 75, 75)
-                clahe = cv2.createCLAHE(clipLimit=roi["clahe"], tileGridSize=(4, 4))
-                contrast = clahe.apply(bilateral)
-
-                if roi["orientation"] == "horizontal":
-                    sobel = cv2.Sobel(contrast, cv2.CV_64F, 0, 1, ksize=3)
-                else:
-                    sobel = cv2.Sobel(contrast, cv2.CV_64F, 1, 0, ksize=3)
-
-                abs_sobel = np.uint8(np.absolute(sobel))
-                projection = np.sum(abs_sobel, axis=1 if roi["orientation"] == "horizontal" else 0).astype(np.float32)
-
-                if roi["orientation"] == "horizontal":
-                    smoothed = cv2.GaussianBlur(projection[:, np.newaxis], (1, roi["smooth"]), 0).flatten()
-                    y = int(np.argmax(smoothed))
-                    x = (LEFT + RIGHT) // 2
-                    center = (x, y + TOP)
-                    start = (LEFT, y + TOP)
-                    end = (RIGHT, y + TOP)
-                else:
-                    smoothed = cv2.GaussianBlur(projection[np.newaxis, :], (roi["smooth"], 1), 0).flatten()
-                    x = int(np.argmax(smoothed))
-                    y = (TOP + BOTTOM) // 2
-                    center = (x + LEFT, y)
-                    start = (x + LEFT, TOP)
-                    end = (x + LEFT, BOTTOM)
-
-                cv2.rectangle(output, (LEFT, TOP), (RIGHT, BOTTOM), box_color, 1)
-                cv2.line(output, start, end, line_color, 2)
-                cv2.circle(output, center, 3, dot_color, -1)
-
-                row.extend([center[0], center[1]])
-
-            # Chamber Detection
-            c_left, c_right, c_top, c_bottom = chamber_roi["left"], chamber_roi["right"], chamber_roi["top"], chamber_roi["bottom"]
-            roi_crop = image[c_top:c_bottom, c_left:c_right]
-            gray = cv2.cvtColor(roi_crop, cv2.COLOR_BGR2GRAY)
-            blurred = cv2.GaussianBlur(gray, (9, 9), 2)
-
-            cv2.rectangle(output, (c_left, c_top), (c_right, c_bottom), box_color, 1)
-
-            chamber_circles = cv2.HoughCircles(
-                blurred, cv2.HOUGH_GRADIENT, dp=1.2, minDist=50,
-                param1=50, param2=30,
-                minRadius=chamber_roi["min_radius"],
-                maxRadius=chamber_roi["max_radius"]
-            )
-
-            if chamber_circles is not None:
-                chamber_circles = np.uint16(np.around(chamber_circles[0, :]))
-                cx, cy, cr = max(chamber_circles, key=lambda c: c[2])
-                cx_full = cx + c_left
-                cy_full = cy + c_top
-                cv2.circle(output, (cx_full, cy_full), cr, chamber_color, 2)
-                cv2.circle(output, (cx_full, cy_full), 3, center_marker_color, -1)
-            else:
-                cx_full, cy_full, cr = -1, -1, -1
-
-            row.extend([cx_full, cy_full, cr])
-
-            # Distance Calculations
-            pixels_per_mm = cr / 3.0 if cr > 0 else -1
-            roi1_y, roi2_y = row[2], row[4]
-            roi3_x, roi4_x = row[5], row[7]
-
-            vertical_distance_px = abs(roi1_y - roi2_y)
-            vertical_distance_mm = vertical_distance_px / pixels_per_mm if pixels_per_mm > 0 else -1
-
-            horizontal_distance_px = abs(roi3_x - roi4_x)
-            horizontal_distance_mm = horizontal_distance_px / pixels_per_mm if pixels_per_mm > 0 else -1
-
-            row.extend([
-                pixels_per_mm,
-                vertical_distance_px, vertical_distance_mm,
-                horizontal_distance_px, horizontal_distance_mm
-            ])
-
-            writer.writerow(row)
-            output_path = os.path.join(output_folder, os.path.splitext(filename)[0] + "_annotated.jpg")
-            cv2.imwrite(output_path, output)
-
-    print(f"Laminate analysis complete. CSV saved to: {csv_output_path}")
+import cv2
+import numpy as np
+import os
+import csv
+from itertools import islice
+
+rois = [
+    {"name": "ROI 1 - Horizontal", "left": 1300, "right": 1375, "top": 510, "bottom": 560, "orientation": "horizontal", "smooth": 9, "clahe": 4.5},
+    {"name": "ROI 2 - Horizontal", "left": 320, "right": 450, "top": 950, "bottom": 1010, "orientation": "horizontal", "smooth": 5, "clahe": 3.0},
+    {"name": "ROI 3 - Vertical", "left": 1100, "right": 1170, "top": 790, "bottom": 870, "orientation": "vertical", "smooth": 5, "clahe": 3.0},
+    {"name": "ROI 4 - Vertical", "left": 750, "right": 810, "top": 790, "bottom": 870, "orientation": "vertical", "smooth": 5, "clahe": 3.0}
+]
+
+chamber_roi = {
+    "left": 1150, "right": 1450, "top": 550, "bottom": 800,
+    "min_radius": 85, "max_radius": 93
+}
+
+#images are loaded and edge-located this many at a time
+laminate_batch_size = 16
+
+#one CLAHE operator per clip limit, reused for every ROI crop
+clahe_operators = {}
+
+def get_clahe(clip_limit):
+    if clip_limit not in clahe_operators:
+        clahe_operators[clip_limit] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(4, 4))
+    return clahe_operators[clip_limit]
+
+#3x3 Sobel over a stack of uint8 images (n, h, w) in integer math - same values and borders as
+#cv2.Sobel(..., ksize=3), but one pass for the whole batch
+def sobel_stack(stack, orientation):
+    padded = np.pad(stack.astype(np.int32), ((0, 0), (1, 1), (1, 1)), mode="reflect")
+    if orientation == "horizontal":
+        diff = padded[:, 2:, :] - padded[:, :-2, :]                    # d/dy
+        return diff[:, :, :-2] + 2 * diff[:, :, 1:-1] + diff[:, :, 2:]
+    diff = padded[:, :, 2:] - padded[:, :, :-2]                        # d/dx
+    return diff[:, :-2, :] + 2 * diff[:, 1:-1, :] + diff[:, 2:, :]
+
+#bilateralFilter(gray, 9, 75, 75) on every crop with a single call: each crop gets its own
+#reflected border (what OpenCV would add), then they're stacked into one tall image so OpenCV can
+#spread the work over all its threads. the 9px window never reaches past a crop's own border
+bilateral_radius = 4
+
+def bilateral_stack(gray_crops):
+    r = bilateral_radius
+    h, w = gray_crops[0].shape
+    tall = np.vstack([cv2.copyMakeBorder(gray, r, r, r, r, cv2.BORDER_REFLECT_101) for gray in gray_crops])
+    filtered = cv2.bilateralFilter(tall, 9, 75, 75)
+    return filtered.reshape(len(gray_crops), h + 2 * r, w + 2 * r)[:, r:-r, r:-r]
+
+#edge position (pixels from the ROI's top or left) for one ROI across a batch of crops
+#exact=True reproduces the original per-image results: the Sobel magnitude wraps at 256 like the old
+#np.uint8 cast and each projection is smoothed on its own. exact=False keeps the full magnitude in
+#float32 and smooths every projection in one call
+def locate_roi_edges(gray_crops, roi, exact=True):
+    clahe = get_clahe(roi["clahe"])
+    contrast = np.stack([clahe.apply(bilateral) for bilateral in bilateral_stack(gray_crops)])
+
+    horizontal = roi["orientation"] == "horizontal"
+    magnitude = np.abs(sobel_stack(contrast, roi["orientation"]))
+    if exact:
+        magnitude &= 0xFF
+    projections = magnitude.sum(axis=2 if horizontal else 1, dtype=np.int64).astype(np.float32)   # (n, length)
+
+    if exact:
+        if horizontal:
+            smoothed = np.stack([cv2.GaussianBlur(p[:, np.newaxis], (1, roi["smooth"]), 0).flatten() for p in projections])
+        else:
+            smoothed = np.stack([cv2.GaussianBlur(p[np.newaxis, :], (roi["smooth"], 1), 0).flatten() for p in projections])
+    else:
+        smoothed = cv2.GaussianBlur(projections, (roi["smooth"], 1), 0)
+
+    return np.argmax(smoothed, axis=1)
+
+def detect_chamber(gray_crop):
+    blurred = cv2.GaussianBlur(gray_crop, (9, 9), 2)
+    chamber_circles = cv2.HoughCircles(
+        blurred, cv2.HOUGH_GRADIENT, dp=1.2, minDist=50,
+        param1=50, param2=30,
+        minRadius=chamber_roi["min_radius"],
+        maxRadius=chamber_roi["max_radius"]
+    )
+    if chamber_circles is None:
+        return None
+    chamber_circles = np.uint16(np.around(chamber_circles[0, :]))
+    return max(chamber_circles, key=lambda c: c[2])
+
+#csv_path: write the results somewhere other than base_folder (used when a run is split into parts)
+#exact=False uses the float32 projections (slightly different, usually sharper, edge picks)
+#image_reader: how a path becomes a BGR image (default cv2.imread). shared_frame_ring passes frames that
+#are only valid until the next path is taken from image_paths
+def process_laminate_images(image_paths, base_folder, csv_path=None, batch_size=laminate_batch_size, exact=True, image_reader=cv2.imread):
+    if not image_paths:
+        print("No images provided for laminate analysis.")
+        return
+
+    output_folder = os.path.join(base_folder, "laminate_position")
+    csv_output_path = csv_path or os.path.join(base_folder, "laminate_position.csv")
+    os.makedirs(output_folder, exist_ok=True)
+
+    box_color = (255, 0, 0)
+    line_color = (0, 255, 255)
+    dot_color = (0, 0, 255)
+    chamber_color = (0, 255, 0)
+    center_marker_color = (0, 0, 255)
+
+    c_left, c_right, c_top, c_bottom = chamber_roi["left"], chamber_roi["right"], chamber_roi["top"], chamber_roi["bottom"]
+
+    with open(csv_output_path, mode='w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        header = ["filename"]
+        for roi in rois:
+            header.append(f"{roi['name']} x")
+            header.append(f"{roi['name']} y")
+        header.extend([
+            "chamber_center_x", "chamber_center_y", "chamber_radius",
+            "pixels_per_mm",
+            "vertical_distance_px", "vertical_distance_mm",
+            "horizontal_distance_px", "horizontal_distance_mm"
+        ])
+        writer.writerow(header)
+
+        paths = iter(image_paths)
+        while True:
+            #keep only what the analysis needs, so the full frame can be let go right away
+            #(each image is read as soon as its path is taken, see image_reader above)
+            filenames, outputs, chamber_grays = [], [], []
+            roi_grays = [[] for _ in rois]
+            n_paths = 0
+            for image_path in islice(paths, batch_size):
+                n_paths += 1
+                filename = os.path.basename(image_path)
+                image = image_reader(image_path)
+                if image is None:
+                    print(f"Could not load {filename}, skipping.")
+                    continue
+
+                filenames.append(filename)
+                outputs.append(image.copy())
+                for roi, grays in zip(rois, roi_grays):
+                    grays.append(cv2.cvtColor(image[roi["top"]:roi["bottom"], roi["left"]:roi["right"]], cv2.COLOR_BGR2GRAY))
+                chamber_grays.append(cv2.cvtColor(image[c_top:c_bottom, c_left:c_right], cv2.COLOR_BGR2GRAY))
+
+            if n_paths == 0:
+                break
+            if not filenames:
+                continue
+
+            #each ROI position across the whole batch at once
+            edges = [locate_roi_edges(grays, roi, exact) for roi, grays in zip(rois, roi_grays)]
+
+            for i, (filename, output) in enumerate(zip(filenames, outputs)):
+                row = [filename]
+
+                for roi, roi_edges in zip(rois, edges):
+                    LEFT, RIGHT, TOP, BOTTOM = roi["left"], roi["right"], roi["top"], roi["bottom"]
+                    if roi["orientation"] == "horizontal":
+                        y = int(roi_edges[i])
+                        x = (LEFT + RIGHT) // 2
+                        center = (x, y + TOP)
+                        start = (LEFT, y + TOP)
+                        end = (RIGHT, y + TOP)
+                    else:
+                        x = int(roi_edges[i])
+                        y = (TOP + BOTTOM) // 2
+                        center = (x + LEFT, y)
+                        start = (x + LEFT, TOP)
+                        end = (x + LEFT, BOTTOM)
+
+                    cv2.rectangle(output, (LEFT, TOP), (RIGHT, BOTTOM), box_color, 1)
+                    cv2.line(output, start, end, line_color, 2)
+                    cv2.circle(output, center, 3, dot_color, -1)
+
+                    row.extend([center[0], center[1]])
+
+                # Chamber Detection
+                cv2.rectangle(output, (c_left, c_top), (c_right, c_bottom), box_color, 1)
+
+                chamber = detect_chamber(chamber_grays[i])
+                if chamber is not None:
+                    cx, cy, cr = chamber
+                    cx_full = cx + c_left
+                    cy_full = cy + c_top
+                    cv2.circle(output, (cx_full, cy_full), cr, chamber_color, 2)
+                    cv2.circle(output, (cx_full, cy_full), 3, center_marker_color, -1)
+                else:
+                    cx_full, cy_full, cr = -1, -1, -1
+
+                row.extend([cx_full, cy_full, cr])
+
+                # Distance Calculations
+                pixels_per_mm = cr / 3.0 if cr > 0 else -1
+                roi1_y, roi2_y = row[2], row[4]
+                roi3_x, roi4_x = row[5], row[7]
+
+                vertical_distance_px = abs(roi1_y - roi2_y)
+                vertical_distance_mm = vertical_distance_px / pixels_per_mm if pixels_per_mm > 0 else -1
+
+                horizontal_distance_px = abs(roi3_x - roi4_x)
+                horizontal_distance_mm = horizontal_distance_px / pixels_per_mm if pixels_per_mm > 0 else -1
+
+                row.extend([
+                    pixels_per_mm,
+                    vertical_distance_px, vertical_distance_mm,
+                    horizontal_distance_px, horizontal_distance_mm
+                ])
+
+                writer.writerow(row)
+                output_path = os.path.join(output_folder, os.path.splitext(filename)[0] + "_annotated.jpg")
+                cv2.imwrite(output_path, output)
+
+    print(f"Laminate analysis complete. CSV saved to: {csv_output_path}")
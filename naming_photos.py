@@ -1,73 +1,215 @@
-import os
-import re
-import easyocr
-from pathlib import Path
-import shutil
-
-
-#iterates over all images in  folder, groups them into groups of four, gets serial number from first in group
-#saves serial number/checks if repeat, then names photos pre/post label, beads, coins, buffers
-
-
-image_folder = "//nuc-fs1/Engineering/Grant/DASH/General Cartridge Run Videos/QC testing cartridge pics/QCBA-06AUG25/G4"
-image_extensions = ('.jpg', '.jpeg', '.png')       #these are saved as .jpg
-
-# Initialize OCR reader
-reader = easyocr.Reader(['en'])
-
-#track and store serial numbers we have seen
-seen_serials = set()
-
-#sort images by name - works with default names from camera
-def sorted_image_list(folder):
-    return sorted(
-        [f for f in os.listdir(folder) if f.lower().endswith(image_extensions)]
-    )
-
-# Rename images in groups of 4
-def process_image_groups(folder):
-    image_files = sorted_image_list(folder)
-    
-    #define each group of four where first pic is the label
-    for i in range(0, len(image_files), 4):
-        group = image_files[i:i+4]
-        if len(group) < 4:
-            print(f"Skipping incomplete group at end: {group}")
-            continue
-        
-        first_image_path = os.path.join(folder, group[0])
-        result = reader.readtext(first_image_path)
-
-        #find four character strings from first image of the group of four
-        four_letter_words = []
-        for _, text, _ in result:
-            cleaned = text.upper()
-            matches = re.findall(r'\b[A-Z]{4}\b', cleaned)
-            four_letter_words.extend(matches)
-        
-        if not four_letter_words:
-            print(f"No 4-letter words found in: {group[0]}")
-            continue
-        
-        serial = four_letter_words[-1]  #use the last 4-letter "word" found in pic as serial number
-        
-        #have we seen this serial number before
-        is_repeat = serial in seen_serials
-        if not is_repeat:
-            seen_serials.add(serial)
-
-        print(f"{'Repeat' if is_repeat else 'First'} use of serial: {serial}")
-
-        time = "post " if is_repeat else "pre "    #post if repeated, pre if not
-        labels = ["label", "beads", "coins", "buffers"]    #need to change order depending on how we take pics
-        for filename, label in zip(group, labels):
-            old_path = os.path.join(folder, filename)
-            ext = Path(filename).suffix
-            new_filename = f"{serial} {time}{label}{ext}"    #serial num, pre/post, label, filetype
-            new_path = os.path.join(folder, new_filename)
-            shutil.move(old_path, new_path)
-            print(f"Renamed: {filename} → {new_filename}")     #prints all old/new names to check
-
-
-process_image_groups(image_folder)
-
+import os
+import re
+import json
+import time
+import argparse
+import easyocr
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+
+#iterates over all images in  folder, groups them into groups of four, gets serial number from first in group
+#saves serial number/checks if repeat, then names photos pre/post label, beads, coins, buffers
+#all renames are planned first (OCR) and written to a journal in the folder, then applied in bulk,
+#so an interrupted run can be resumed or undone without OCRing anything again
+
+
+image_folder = "//nuc-fs1/Engineering/Grant/DASH/General Cartridge Run Videos/QC testing cartridge pics/QCBA-06AUG25/G4"
+image_extensions = ('.jpg', '.jpeg', '.png')       #these are saved as .jpg
+
+journal_name = "rename_journal.json"
+serials_name = "seen_serials.json"    #kept next to the group folders (G1, G2, ...) so all of them share it
+rename_workers = 16                   #renames on the network share are latency bound, so run many at once
+
+# OCR reader - loading the model is slow, so it is created on first use and kept
+reader = None
+
+def get_reader():
+    global reader
+    if reader is None:
+        reader = easyocr.Reader(['en'])
+    return reader
+
+#track and store serial numbers we have seen - persisted so pre/post is right across runs and folders
+def default_serials_path(folder):
+    return os.path.join(os.path.dirname(os.path.normpath(folder)), serials_name)
+
+def load_seen_serials(serials_path):
+    if not os.path.exists(serials_path):
+        return set()
+    with open(serials_path, "r") as f:
+        return set(json.load(f))
+
+#write to a temp file and swap it in so a crash never leaves half a file behind
+def write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+def save_seen_serials(seen_serials, serials_path):
+    write_json(serials_path, sorted(seen_serials))
+
+#sort images by name - works with default names from camera
+def sorted_image_list(folder):
+    return sorted(
+        [f for f in os.listdir(folder) if f.lower().endswith(image_extensions)]
+    )
+
+#OCR the label picture, returns the serial number or None
+def read_serial(image_path):
+    result = get_reader().readtext(image_path)
+
+    #find four character strings from first image of the group of four
+    four_letter_words = []
+    for _, text, _ in result:
+        cleaned = text.upper()
+        matches = re.findall(r'\b[A-Z]{4}\b', cleaned)
+        four_letter_words.extend(matches)
+
+    if not four_letter_words:
+        return None
+    return four_letter_words[-1]  #use the last 4-letter "word" found in pic as serial number
+
+# Work out the new names for images in groups of 4 - nothing is renamed here
+def plan_renames(folder, seen_serials):
+    image_files = sorted_image_list(folder)
+    renames = []
+    new_serials = []
+    planned_names = set()
+
+    #define each group of four where first pic is the label
+    for i in range(0, len(image_files), 4):
+        group = image_files[i:i+4]
+        if len(group) < 4:
+            print(f"Skipping incomplete group at end: {group}")
+            continue
+
+        serial = read_serial(os.path.join(folder, group[0]))
+        if serial is None:
+            print(f"No 4-letter words found in: {group[0]}")
+            continue
+
+        #have we seen this serial number before
+        is_repeat = serial in seen_serials
+        if not is_repeat:
+            seen_serials.add(serial)
+            new_serials.append(serial)
+
+        print(f"{'Repeat' if is_repeat else 'First'} use of serial: {serial}")
+
+        time_label = "post " if is_repeat else "pre "    #post if repeated, pre if not
+        labels = ["label", "beads", "coins", "buffers"]    #need to change order depending on how we take pics
+        group_renames = []
+        for filename, label in zip(group, labels):
+            ext = Path(filename).suffix
+            new_filename = f"{serial} {time_label}{label}{ext}"    #serial num, pre/post, label, filetype
+            group_renames.append({"src": filename, "dst": new_filename})
+
+        #never let two photos end up with the same name
+        new_names = [r["dst"] for r in group_renames]
+        if planned_names.intersection(new_names) or any(os.path.exists(os.path.join(folder, n)) for n in new_names):
+            print(f"Names for serial {serial} ({group[0]}...) are already taken, leaving this group as is")
+            continue
+        planned_names.update(new_names)
+        renames.extend(group_renames)
+
+    return {
+        "status": "planned",
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "new_serials": new_serials,
+        "renames": renames
+    }
+
+#same-volume rename of one file, skipped if already done so resume/undo can be re-run safely
+def rename_one(folder, src, dst):
+    src_path = os.path.join(folder, src)
+    dst_path = os.path.join(folder, dst)
+    if not os.path.exists(src_path):
+        return "done" if os.path.exists(dst_path) else "missing"
+    if os.path.exists(dst_path):
+        return "target exists"
+    os.rename(src_path, dst_path)
+    return "renamed"
+
+#apply (or undo) every rename in the journal on a thread pool
+def apply_journal(folder, journal, undo=False, workers=rename_workers):
+    pairs = [(r["dst"], r["src"]) if undo else (r["src"], r["dst"]) for r in journal["renames"]]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(lambda pair: rename_one(folder, *pair), pairs))
+
+    failed = 0
+    for (src, dst), outcome in zip(pairs, outcomes):
+        if outcome == "renamed":
+            print(f"Renamed: {src} → {dst}")     #prints all old/new names to check
+        elif outcome != "done":
+            failed += 1
+            print(f"Could not rename {src} → {dst}: {outcome}")
+    return failed
+
+def process_image_groups(folder, serials_path=None, workers=rename_workers):
+    serials_path = serials_path or default_serials_path(folder)
+    journal_path = os.path.join(folder, journal_name)
+    journal = None
+    if os.path.exists(journal_path):
+        with open(journal_path, "r") as f:
+            journal = json.load(f)
+
+    if journal is not None and journal["status"] == "complete":
+        print(f"{folder} was already renamed (see {journal_name}). Undo it or delete the journal to redo it.")
+        return
+
+    if journal is not None and journal["status"] == "planned":
+        print(f"Resuming renames from {journal_path}")
+    else:
+        seen_serials = load_seen_serials(serials_path)
+        journal = plan_renames(folder, seen_serials)
+        #journal first, then serials - if we stop in between, the journal still drives the resume
+        write_json(journal_path, journal)
+        save_seen_serials(seen_serials, serials_path)
+
+    start = time.perf_counter()
+    failed = apply_journal(folder, journal, workers=workers)
+    if failed == 0:
+        journal["status"] = "complete"
+        write_json(journal_path, journal)
+    print(f"{len(journal['renames']) - failed} renames applied in {time.perf_counter() - start:.1f} s"
+          + (f", {failed} failed - fix and re-run to resume" if failed else ""))
+
+#put every file in the folder back to its original name and forget the serials this run added
+def undo_image_groups(folder, serials_path=None, workers=rename_workers):
+    serials_path = serials_path or default_serials_path(folder)
+    journal_path = os.path.join(folder, journal_name)
+    if not os.path.exists(journal_path):
+        print(f"No {journal_name} in {folder}, nothing to undo.")
+        return
+    with open(journal_path, "r") as f:
+        journal = json.load(f)
+
+    failed = apply_journal(folder, journal, undo=True, workers=workers)
+    if failed:
+        print(f"{failed} renames could not be undone - fix and re-run the undo.")
+        return
+
+    if journal["status"] != "undone":
+        seen_serials = load_seen_serials(serials_path)
+        seen_serials.difference_update(journal["new_serials"])
+        save_seen_serials(seen_serials, serials_path)
+        journal["status"] = "undone"
+        write_json(journal_path, journal)
+    print(f"Undid {len(journal['renames'])} renames in {folder}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR serial numbers and rename cartridge photos in groups of four.")
+    parser.add_argument("folder", nargs="?", default=image_folder)
+    parser.add_argument("--undo", action="store_true", help="restore the original names from the journal")
+    parser.add_argument("--serials-file", help=f"seen serials file (default: {serials_name} next to the folder)")
+    parser.add_argument("--workers", type=int, default=rename_workers)
+    args = parser.parse_args()
+
+    if args.undo:
+        undo_image_groups(args.folder, args.serials_file, args.workers)
+    else:
+        process_image_groups(args.folder, args.serials_file, args.workers)
@@ -1,113 +1,201 @@
-import cv2
-import numpy as np
-import os
-import csv
-
-def process_pmps_images(image_paths, base_folder):
-    if not image_paths:
-        print("No images provided for PMPS analysis.")
-        return
-
-    output_csv = os.path.join(base_folder, "pmp_analysis.csv")
-    mask_output_folder = os.path.join(base_folder, "thresholded_pmps")
-    annotated_output_folder = os.path.join(base_folder, "pmps_in_chamber")
-    os.makedirs(mask_output_folder, exist_ok=True)
-    os.makedirs(annotated_output_folder, exist_ok=True)
-
-    LEFT, RIGHT, TOP, BOTTOM = 1150, 1450, 550, 850
-
-    chamber_min_radius = 83
-    chamber_max_radius = 100
-    dp = 1.2
-    min_dist = 50
-    param1 = 50
-    param2 = 30
-
-    lower_bound = np.array([0, 79, 72])
-    upper_bound = np.array([255, 255, 142])
-
-    results = [(
-        "Filename",
-        "Chamber center X", "Chamber center Y", "Chamber radius", "Chamber detected?",
-        "Total chamber area (px)",
-        "PMPs in chamber (px)",
-        "Percent PMP in chamber area",
-        "Percent total PMP area"
-    )]
-
-    for img_path in image_paths:
-        filename = os.path.basename(img_path)
-        image = cv2.imread(img_path)
-        if image is None:
-            print(f"Could not read {filename}. Skipping.")
-            continue
-
-        cv2.rectangle(image, (LEFT, TOP), (RIGHT, BOTTOM), (255, 0, 0), 2)
-        roi = image[TOP:BOTTOM, LEFT:RIGHT]
-        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (9, 9), 2)
-
-        chamber_detected = False
-        chamber_mask = None
-        cx_full, cy_full, cr = -1, -1, -1
-
-        circles = cv2.HoughCircles(
-            blurred, cv2.HOUGH_GRADIENT, dp=dp, minDist=min_dist,
-            param1=param1, param2=param2,
-            minRadius=chamber_min_radius, maxRadius=chamber_max_radius
-        )
-
-        if circles is not None:
-            chamber_detected = True
-            circle = np.uint16(np.around(circles[0, 0]))
-            cx, cy, cr = circle
-            cx_full = cx + LEFT
-            cy_full = cy + TOP
-
-            cv2.circle(image, (cx_full, cy_full), cr, (0, 255, 0), 2)
-            cv2.circle(image, (cx_full, cy_full), 4, (0, 0, 255), -1)
-
-            chamber_mask = np.zeros(image.shape[:2], dtype=np.uint8)
-            cv2.circle(chamber_mask, (cx_full, cy_full), cr, 255, -1)
-
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        threshold_mask = cv2.inRange(hsv, lower_bound, upper_bound)
-
-        mask_filename = os.path.splitext(filename)[0] + "_mask.png"
-        cv2.imwrite(os.path.join(mask_output_folder, mask_filename), threshold_mask)
-
-        if chamber_detected:
-            threshold_in_chamber = cv2.bitwise_and(threshold_mask, threshold_mask, mask=chamber_mask)
-            chamber_area_px = int(np.count_nonzero(chamber_mask))
-            thresholded_px = int(np.count_nonzero(threshold_in_chamber))
-            percent_area = (thresholded_px / chamber_area_px) * 100 if chamber_area_px > 0 else 0
-
-            threshold_roi_rect = threshold_mask[TOP:BOTTOM, LEFT:RIGHT]
-            roi_threshold_px = int(np.count_nonzero(threshold_roi_rect))
-            roi_vs_chamber_ratio = (roi_threshold_px / chamber_area_px) * 100 if chamber_area_px > 0 else 0
-        else:
-            chamber_area_px = 0
-            thresholded_px = 0
-            percent_area = 0
-            roi_vs_chamber_ratio = 0
-
-        annotated_path = os.path.join(annotated_output_folder, filename)
-        cv2.imwrite(annotated_path, image)
-
-        results.append((
-            filename,
-            cx_full, cy_full, cr, chamber_detected,
-            chamber_area_px,
-            thresholded_px,
-            percent_area,
-            roi_vs_chamber_ratio
-        ))
-
-    with open(output_csv, mode="w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerows(results)
-
-    print(f"\nPMPS analysis done!")
-    print(f"CSV saved to: {output_csv}")
-    print(f"Masks saved in: {mask_output_folder}")
-    print(f"Annotated images saved in: {annotated_output_folder}")
\ No newline at end of file
+import cv2
+import numpy as np
+import os
+import csv
+
+LEFT, RIGHT, TOP, BOTTOM = 1150, 1450, 550, 850
+
+chamber_min_radius = 83
+chamber_max_radius = 100
+dp = 1.2
+min_dist = 50
+param1 = 50
+param2 = 30
+
+lower_bound = np.array([0, 79, 72])
+upper_bound = np.array([255, 255, 142])
+
+#quantized HSV histogram of the chamber, kept per image so the PMP bounds can be changed later
+#without reprocessing: 30 hue bins (6 values each over OpenCV's 0-179), 32 S and 32 V bins (8 values each)
+hsv_hist_bins = (30, 32, 32)
+hsv_hist_ranges = (180, 256, 256)
+
+def chamber_hsv_histogram(hsv, cx_full, cy_full, cr, chamber_mask):
+    # only the circle's bounding box matters
+    cx_full, cy_full, cr = int(cx_full), int(cy_full), int(cr)
+    y0, y1 = max(cy_full - cr, 0), cy_full + cr + 1
+    x0, x1 = max(cx_full - cr, 0), cx_full + cr + 1
+    hist = cv2.calcHist(
+        [hsv[y0:y1, x0:x1]], [0, 1, 2], chamber_mask[y0:y1, x0:x1],
+        list(hsv_hist_bins), [0, hsv_hist_ranges[0], 0, hsv_hist_ranges[1], 0, hsv_hist_ranges[2]]
+    )
+    return hist.astype(np.int32)
+
+#fraction of each histogram bin's integer values that fall inside [low, high] (inclusive, like cv2.inRange)
+def bin_weights(n_bins, value_range, low, high):
+    width = value_range // n_bins
+    starts = np.arange(n_bins) * width
+    ends = starts + width - 1
+    overlap = np.minimum(ends, high) - np.maximum(starts, low) + 1
+    return np.clip(overlap, 0, width) / width
+
+#PMP pixels in the chamber for new HSV bounds, straight from the stored histograms
+#hists: (n_images, 30, 32, 32). exact when the bounds fall on bin edges, otherwise
+#partially covered bins are counted in proportion (assumes values are spread evenly within a bin)
+def pmp_pixels_from_histograms(hists, low, high):
+    weights = [bin_weights(n, r, lo, hi) for n, r, lo, hi in zip(hsv_hist_bins, hsv_hist_ranges, low, high)]
+    return np.einsum("nhsv,h,s,v->n", hists, *weights)
+
+#measure PMPs in a single BGR frame (photo or video frame)
+#annotations are drawn onto the frame in place; the ROI box is drawn before detection, same as always
+def analyze_pmps_frame(image):
+    cv2.rectangle(image, (LEFT, TOP), (RIGHT, BOTTOM), (255, 0, 0), 2)
+    roi = image[TOP:BOTTOM, LEFT:RIGHT]
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (9, 9), 2)
+
+    chamber_detected = False
+    chamber_mask = None
+    chamber_hist = np.zeros(hsv_hist_bins, dtype=np.int32)
+    cx_full, cy_full, cr = -1, -1, -1
+
+    circles = cv2.HoughCircles(
+        blurred, cv2.HOUGH_GRADIENT, dp=dp, minDist=min_dist,
+        param1=param1, param2=param2,
+        minRadius=chamber_min_radius, maxRadius=chamber_max_radius
+    )
+
+    if circles is not None:
+        chamber_detected = True
+        circle = np.uint16(np.around(circles[0, 0]))
+        cx, cy, cr = circle
+        cx_full = cx + LEFT
+        cy_full = cy + TOP
+
+        cv2.circle(image, (cx_full, cy_full), cr, (0, 255, 0), 2)
+        cv2.circle(image, (cx_full, cy_full), 4, (0, 0, 255), -1)
+
+        chamber_mask = np.zeros(image.shape[:2], dtype=np.uint8)
+        cv2.circle(chamber_mask, (cx_full, cy_full), cr, 255, -1)
+
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    threshold_mask = cv2.inRange(hsv, lower_bound, upper_bound)
+
+    if chamber_detected:
+        threshold_in_chamber = cv2.bitwise_and(threshold_mask, threshold_mask, mask=chamber_mask)
+        chamber_area_px = int(np.count_nonzero(chamber_mask))
+        thresholded_px = int(np.count_nonzero(threshold_in_chamber))
+        percent_area = (thresholded_px / chamber_area_px) * 100 if chamber_area_px > 0 else 0
+
+        threshold_roi_rect = threshold_mask[TOP:BOTTOM, LEFT:RIGHT]
+        roi_threshold_px = int(np.count_nonzero(threshold_roi_rect))
+        roi_vs_chamber_ratio = (roi_threshold_px / chamber_area_px) * 100 if chamber_area_px > 0 else 0
+
+        chamber_hist = chamber_hsv_histogram(hsv, cx_full, cy_full, cr, chamber_mask)
+    else:
+        chamber_area_px = 0
+        thresholded_px = 0
+        percent_area = 0
+        roi_vs_chamber_ratio = 0
+
+    return {
+        "row": (
+            cx_full, cy_full, cr, chamber_detected,
+            chamber_area_px,
+            thresholded_px,
+            percent_area,
+            roi_vs_chamber_ratio
+        ),
+        "threshold_mask": threshold_mask,
+        "chamber_area_px": chamber_area_px,
+        "chamber_hist": chamber_hist
+    }
+
+#csv_path/histogram_path: write the results somewhere other than base_folder (used when a run is split into parts)
+#image_reader: how a path becomes a BGR image (default cv2.imread). shared_frame_ring passes frames that
+#are only valid until the next path is taken from image_paths
+def process_pmps_images(image_paths, base_folder, csv_path=None, histogram_path=None, image_reader=cv2.imread):
+    if not image_paths:
+        print("No images provided for PMPS analysis.")
+        return
+
+    output_csv = csv_path or os.path.join(base_folder, "pmp_analysis.csv")
+    mask_output_folder = os.path.join(base_folder, "thresholded_pmps")
+    annotated_output_folder = os.path.join(base_folder, "pmps_in_chamber")
+    os.makedirs(mask_output_folder, exist_ok=True)
+    os.makedirs(annotated_output_folder, exist_ok=True)
+
+    histogram_path = histogram_path or os.path.join(base_folder, "pmp_histograms.npz")
+    hist_filenames, chamber_hists, chamber_areas = [], [], []
+
+    results = [(
+        "Filename",
+        "Chamber center X", "Chamber center Y", "Chamber radius", "Chamber detected?",
+        "Total chamber area (px)",
+        "PMPs in chamber (px)",
+        "Percent PMP in chamber area",
+        "Percent total PMP area"
+    )]
+
+    for img_path in image_paths:
+        filename = os.path.basename(img_path)
+        image = image_reader(img_path)
+        if image is None:
+            print(f"Could not read {filename}. Skipping.")
+            continue
+
+        analysis = analyze_pmps_frame(image)
+
+        mask_filename = os.path.splitext(filename)[0] + "_mask.png"
+        cv2.imwrite(os.path.join(mask_output_folder, mask_filename), analysis["threshold_mask"])
+
+        annotated_path = os.path.join(annotated_output_folder, filename)
+        cv2.imwrite(annotated_path, image)
+
+        results.append((filename,) + analysis["row"])
+
+        hist_filenames.append(filename)
+        chamber_hists.append(analysis["chamber_hist"])
+        chamber_areas.append(analysis["chamber_area_px"])
+
+    with open(output_csv, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerows(results)
+
+    if hist_filenames:
+        np.savez_compressed(
+            histogram_path,
+            filenames=np.array(hist_filenames),
+            chamber_hists=np.array(chamber_hists, dtype=np.int32),
+            chamber_areas=np.array(chamber_areas, dtype=np.int64)
+        )
+
+    print(f"\nPMPS analysis done!")
+    print(f"CSV saved to: {output_csv}")
+    print(f"Masks saved in: {mask_output_folder}")
+    print(f"Annotated images saved in: {annotated_output_folder}")
+    print(f"Chamber HSV histograms saved to: {histogram_path}")
+
+#recompute PMP area for the whole run with new HSV bounds, without touching the images again
+def rethreshold_pmps_run(base_folder, new_lower_bound, new_upper_bound):
+    histogram_path = os.path.join(base_folder, "pmp_histograms.npz")
+    if not os.path.exists(histogram_path):
+        print(f"No PMP histograms in {base_folder} - run process_pmps_images first.")
+        return None
+
+    data = np.load(histogram_path)
+    pmp_px = pmp_pixels_from_histograms(data["chamber_hists"], new_lower_bound, new_upper_bound)
+    areas = data["chamber_areas"]
+    percent = np.where(areas > 0, pmp_px / np.maximum(areas, 1) * 100, 0)
+
+    low = "_".join(str(int(v)) for v in new_lower_bound)
+    high = "_".join(str(int(v)) for v in new_upper_bound)
+    output_csv = os.path.join(base_folder, f"pmp_analysis_{low}_to_{high}.csv")
+    with open(output_csv, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("Filename", "Total chamber area (px)", "PMPs in chamber (px)", "Percent PMP in chamber area"))
+        for filename, area, px, pct in zip(data["filenames"], areas, pmp_px, percent):
+            writer.writerow((filename, int(area), f"{px:.1f}", pct))
+
+    print(f"PMPs re-thresholded for {len(areas)} images. CSV saved to: {output_csv}")
+    return output_csv
@@ -0,0 +1,167 @@
+import os
+import multiprocessing
+import multiprocessing.connection
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+
+#decoder stage + shared memory ring for feeding analysis worker processes.
+#one decoder process reads and decodes the images into a fixed ring of shared memory slots; workers get
+#NumPy views straight onto a slot (nothing pickled but the path, shape and slot number) and hand the slot
+#back when they move on to the next image. the decoder waits for a free slot when the ring is full,
+#so memory stays at n_slots frames however far ahead of the workers it gets.
+#
+#works with any process_*_images function: the worker passes a RingFrames as both image_paths and
+#image_reader, so the function's usual "for path in image_paths: image = image_reader(path)" loop
+#pulls frames from the ring.
+
+#same reasoning as the scheduler - never fork after OpenCV has started its thread pool
+mp_context = multiprocessing.get_context("spawn")
+
+#header-only read isn't available in cv2, so size slots from the first image that decodes
+def probe_frame_bytes(image_paths):
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is not None:
+            return image.nbytes
+    return None
+
+def attach(shm_name):
+    #the creating process owns cleanup; on POSIX, stop this process's resource tracker from
+    #unlinking the block when it exits
+    shm = shared_memory.SharedMemory(name=shm_name)
+    if os.name == "posix":
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def close_quietly(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass    #a view is still alive somewhere - the OS frees the mapping when the process exits
+
+#decoder stage: one message per path on ready_queue, then one None per consumer
+#message: (path, slot, shape, dtype, image) - slot is None when the frame didn't fit a slot (image is then
+#sent pickled) or couldn't be read (image is None)
+def decode_frames(image_paths, shm_name, slot_bytes, free_slots, ready_queue, n_consumers):
+    cv2.setNumThreads(1)
+    shm = attach(shm_name)
+    try:
+        for path in image_paths:
+            image = cv2.imread(path)
+            if image is None or image.nbytes > slot_bytes:
+                ready_queue.put((path, None, None, None, image))
+                continue
+            slot = free_slots.get()    #blocks while every slot is in use - this is the backpressure
+            view = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf, offset=slot * slot_bytes)
+            view[...] = image
+            del view
+            ready_queue.put((path, slot, image.shape, image.dtype.str, None))
+    finally:
+        for _ in range(n_consumers):
+            ready_queue.put(None)
+        close_quietly(shm)
+
+#consumer side: iterate it for paths, call it (or .read) for the frame of the current path
+class RingFrames:
+    def __init__(self, shm_name, slot_bytes, free_slots, ready_queue):
+        self.shm = attach(shm_name)
+        self.slot_bytes = slot_bytes
+        self.free_slots = free_slots
+        self.ready_queue = ready_queue
+        self.current = None
+
+    def __iter__(self):
+        while True:
+            self.release()
+            message = self.ready_queue.get()
+            if message is None:
+                return
+            self.current = message
+            yield message[0]
+
+    def read(self, path):
+        current_path, slot, shape, dtype, image = self.current
+        if path != current_path:
+            raise ValueError(f"Asked for {path} but the current frame is {current_path}")
+        if slot is None:
+            return image
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    __call__ = read
+
+    #give the current slot back to the decoder
+    def release(self):
+        if self.current is not None and self.current[1] is not None:
+            self.free_slots.put(self.current[1])
+        self.current = None
+
+    def close(self):
+        self.release()
+        close_quietly(self.shm)
+
+#worker process: run one process_*_images call over whatever frames it gets from the ring
+def consume_frames(process_func, input_folder, kwargs, shm_name, slot_bytes, free_slots, ready_queue, n_threads):
+    cv2.setNumThreads(n_threads)
+    frames = RingFrames(shm_name, slot_bytes, free_slots, ready_queue)
+    try:
+        process_func(frames, input_folder, image_reader=frames, **kwargs)
+        #drain anything left so the decoder is never stuck waiting on this worker
+        for _ in frames:
+            pass
+    finally:
+        frames.close()
+
+#run process_func over image_paths with one decoder process and len(worker_kwargs) analysis workers
+#worker_kwargs: one dict of extra arguments per worker - give each its own csv_path (and histogram_path),
+#workers take frames as they become free so each part holds an arbitrary subset of the images
+def run_shared_frame_stage(process_func, image_paths, input_folder, worker_kwargs,
+                           n_threads=1, n_slots=None, slot_bytes=None):
+    image_paths = list(image_paths)
+    n_workers = len(worker_kwargs)
+    n_slots = n_slots or 2 * n_workers + 2
+    slot_bytes = slot_bytes or probe_frame_bytes(image_paths)
+    if not slot_bytes:
+        print("No readable images for the shared frame ring.")
+        return
+
+    shm = shared_memory.SharedMemory(create=True, size=n_slots * slot_bytes)
+    free_slots = mp_context.Queue()
+    for slot in range(n_slots):
+        free_slots.put(slot)
+    ready_queue = mp_context.Queue(maxsize=n_slots + n_workers)
+
+    decoder = mp_context.Process(
+        target=decode_frames,
+        args=(image_paths, shm.name, slot_bytes, free_slots, ready_queue, n_workers),
+        daemon=True
+    )
+    workers = [
+        mp_context.Process(
+            target=consume_frames,
+            args=(process_func, input_folder, kwargs, shm.name, slot_bytes, free_slots, ready_queue, n_threads)
+        )
+        for kwargs in worker_kwargs
+    ]
+    try:
+        decoder.start()
+        for worker in workers:
+            worker.start()
+        #a worker that dies keeps its slots, which would stall everyone else - so stop as soon as one fails
+        running = list(workers)
+        while running:
+            multiprocessing.connection.wait([w.sentinel for w in running])
+            for worker in [w for w in running if not w.is_alive()]:
+                running.remove(worker)
+                if worker.exitcode != 0:
+                    raise RuntimeError(f"Shared frame worker failed (exit code {worker.exitcode})")
+        decoder.join()
+    finally:
+        for process in [decoder] + workers:
+            if process.is_alive():
+                process.terminate()
+        shm.close()
+        shm.unlink()
@@ -1,114 +1,195 @@
-import cv2
-import numpy as np
-import os
-import csv
-
-def process_wax_melt_images(image_paths, input_folder):
-    if not image_paths:
-        print("No images provided for wax melt analysis.")
-        return
-
-    # Setup output directories
-    output_folder = os.path.join(input_folder, "wax_melt_analysis")
-    mask_output_folder = os.path.join(input_folder, "threshold_wax")
-    csv_output_path = os.path.join(input_folder, "wax_analysis.csv")
-    os.makedirs(output_folder, exist_ok=True)
-    os.makedirs(mask_output_folder, exist_ok=True)
-
-    # ROI box coordinates
-    LEFT, RIGHT, TOP, BOTTOM = 1150, 1450, 550, 800
-    chamber_min_radius, chamber_max_radius = 80, 93
-    chamber_radius_mm = 3.0
-    threshold_value = 127
-
-    # Start CSV
-    with open(csv_output_path, mode='w', newline='') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow([
-            'filename',
-            'rect1_white_percent', 'rect1_dark_percent',
-            'rect2_white_percent', 'rect2_dark_percent',
-            'total_white_percent', 'total_dark_percent'
-        ])
-
-        for img_path in image_paths:
-            filename = os.path.basename(img_path)
-            image = cv2.imread(img_path)
-            if image is None:
-                print(f"Warning: Could not read {filename}. Skipping.")
-                continue
-
-            # Crop ROI for chamber detection
-            roi = image[TOP:BOTTOM, LEFT:RIGHT]
-            gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            blurred = cv2.GaussianBlur(gray, (9, 9), 2)
-
-            # Detect chamber
-            circles = cv2.HoughCircles(
-                blurred, cv2.HOUGH_GRADIENT, dp=1.2, minDist=50,
-                param1=50, param2=30,
-                minRadius=chamber_min_radius, maxRadius=chamber_max_radius
-            )
-
-            if circles is None:
-                print(f"{filename} - Chamber not detected, skipping.")
-                continue
-
-            circle = max(np.uint16(np.around(circles[0, :])), key=lambda c: c[2])
-            cx, cy, cr = circle
-            cx_full, cy_full = cx + LEFT, cy + TOP
-            px_per_mm = cr / chamber_radius_mm
-
-            # Rectangle 1
-            br_x = int(cx_full - 1.5 * px_per_mm)
-            br_y = int(cy_full - 3.15 * px_per_mm)
-            width1 = int(1.5 * px_per_mm)
-            height1 = int(5.0 * px_per_mm)
-            tl_x = br_x - width1
-            tl_y = br_y - height1
-
-            # Rectangle 2
-            width2 = int(14.4 * px_per_mm)
-            height2 = int(1.5 * px_per_mm)
-            tr_x, tr_y = tl_x, tl_y
-            bl_x, bl_y = tr_x - width2, tr_y + height2
-
-            # Grayscale full image
-            gray_full = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-            def analyze_roi(x1, y1, x2, y2, name):
-                roi = gray_full[min(y1, y2):max(y1, y2), min(x1, x2):max(x1, x2)]
-                _, binary = cv2.threshold(roi, threshold_value, 255, cv2.THRESH_BINARY)
-                total = binary.size
-                white = cv2.countNonZero(binary)
-                dark = total - white
-                white_pct = white / total * 100
-                dark_pct = dark / total * 100
-                mask_path = os.path.join(mask_output_folder, f"{os.path.splitext(filename)[0]}_{name}.png")
-                cv2.imwrite(mask_path, binary)
-                return white_pct, dark_pct
-
-            w1, d1 = analyze_roi(tl_x, tl_y, br_x, br_y, "rect1_thresh")
-            w2, d2 = analyze_roi(bl_x, bl_y, tr_x, tr_y, "rect2_thresh")
-            total_white = w1 + w2
-            total_dark = d1 + d2
-
-            # Annotate
-            cv2.circle(image, (cx_full, cy_full), cr, (0, 255, 0), 2)
-            cv2.circle(image, (cx_full, cy_full), 5, (0, 255, 0), -1)
-            cv2.rectangle(image, (tl_x, tl_y), (br_x, br_y), (255, 255, 0), 2)
-            cv2.rectangle(image, (bl_x, bl_y), (tr_x, tr_y), (0, 255, 255), 2)
-
-            annotated_path = os.path.join(output_folder, filename)
-            cv2.imwrite(annotated_path, image)
-
-            csv_writer.writerow([
-                filename,
-                f"{w1:.2f}", f"{d1:.2f}",
-                f"{w2:.2f}", f"{d2:.2f}",
-                f"{total_white:.2f}", f"{total_dark:.2f}"
-            ])
-
-            print(f"{filename} - Rect1: {w1:.1f}%, Rect2: {w2:.1f}% white")
-
-    print(f"\nWax melt analysis done! CSV: {csv_output_path}")
+import cv2
+import numpy as np
+import os
+import csv
+
+# ROI box coordinates
+LEFT, RIGHT, TOP, BOTTOM = 1150, 1450, 550, 800
+chamber_min_radius, chamber_max_radius = 80, 93
+chamber_radius_mm = 3.0
+threshold_value = 127
+
+def analyze_roi(gray_full, x1, y1, x2, y2):
+    roi = gray_full[min(y1, y2):max(y1, y2), min(x1, x2):max(x1, x2)]
+    _, binary = cv2.threshold(roi, threshold_value, 255, cv2.THRESH_BINARY)
+    total = binary.size
+    white = cv2.countNonZero(binary)
+    dark = total - white
+    white_pct = white / total * 100
+    dark_pct = dark / total * 100
+    # 256-bin gray histogram of the rectangle so white % can be recomputed for any threshold later
+    hist = cv2.calcHist([roi], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+    return white_pct, dark_pct, binary, hist
+
+#white % of each rectangle for a new threshold, straight from the stored histograms
+#hists: (..., 256) gray histograms. THRESH_BINARY makes pixels > threshold white
+def white_percent_from_histograms(hists, new_threshold):
+    cumulative = np.cumsum(hists, axis=-1)
+    total = cumulative[..., -1]
+    white = total - cumulative[..., int(new_threshold)]
+    return np.where(total > 0, white / np.maximum(total, 1) * 100, 0)
+
+#measure wax melt in a single BGR frame (photo or video frame)
+#returns None if the chamber is not detected
+def measure_wax_melt(image):
+    # Crop ROI for chamber detection
+    roi = image[TOP:BOTTOM, LEFT:RIGHT]
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (9, 9), 2)
+
+    # Detect chamber
+    circles = cv2.HoughCircles(
+        blurred, cv2.HOUGH_GRADIENT, dp=1.2, minDist=50,
+        param1=50, param2=30,
+        minRadius=chamber_min_radius, maxRadius=chamber_max_radius
+    )
+
+    if circles is None:
+        return None
+
+    circle = max(np.uint16(np.around(circles[0, :])), key=lambda c: c[2])
+    cx, cy, cr = circle
+    cx_full, cy_full = cx + LEFT, cy + TOP
+    px_per_mm = cr / chamber_radius_mm
+
+    # Rectangle 1
+    br_x = int(cx_full - 1.5 * px_per_mm)
+    br_y = int(cy_full - 3.15 * px_per_mm)
+    width1 = int(1.5 * px_per_mm)
+    height1 = int(5.0 * px_per_mm)
+    tl_x = br_x - width1
+    tl_y = br_y - height1
+
+    # Rectangle 2
+    width2 = int(14.4 * px_per_mm)
+    height2 = int(1.5 * px_per_mm)
+    tr_x, tr_y = tl_x, tl_y
+    bl_x, bl_y = tr_x - width2, tr_y + height2
+
+    # Grayscale full image
+    gray_full = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    w1, d1, binary1, hist1 = analyze_roi(gray_full, tl_x, tl_y, br_x, br_y)
+    w2, d2, binary2, hist2 = analyze_roi(gray_full, bl_x, bl_y, tr_x, tr_y)
+
+    return {
+        "chamber": (cx_full, cy_full, cr),
+        "rect1": ((tl_x, tl_y), (br_x, br_y)),
+        "rect2": ((bl_x, bl_y), (tr_x, tr_y)),
+        "rect1_percent": (w1, d1),
+        "rect2_percent": (w2, d2),
+        "rect1_thresh": binary1,
+        "rect2_thresh": binary2,
+        "rect1_hist": hist1,
+        "rect2_hist": hist2
+    }
+
+#csv_path/histogram_path: write the results somewhere other than input_folder (used when a run is split into parts)
+#image_reader: how a path becomes a BGR image (default cv2.imread). shared_frame_ring passes frames that
+#are only valid until the next path is taken from image_paths
+def process_wax_melt_images(image_paths, input_folder, csv_path=None, histogram_path=None, image_reader=cv2.imread):
+    if not image_paths:
+        print("No images provided for wax melt analysis.")
+        return
+
+    # Setup output directories
+    output_folder = os.path.join(input_folder, "wax_melt_analysis")
+    mask_output_folder = os.path.join(input_folder, "threshold_wax")
+    csv_output_path = csv_path or os.path.join(input_folder, "wax_analysis.csv")
+    histogram_path = histogram_path or os.path.join(input_folder, "wax_histograms.npz")
+    hist_filenames, rect_hists = [], []
+    os.makedirs(output_folder, exist_ok=True)
+    os.makedirs(mask_output_folder, exist_ok=True)
+
+    # Start CSV
+    with open(csv_output_path, mode='w', newline='') as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow([
+            'filename',
+            'rect1_white_percent', 'rect1_dark_percent',
+            'rect2_white_percent', 'rect2_dark_percent',
+            'total_white_percent', 'total_dark_percent'
+        ])
+
+        for img_path in image_paths:
+            filename = os.path.basename(img_path)
+            image = image_reader(img_path)
+            if image is None:
+                print(f"Warning: Could not read {filename}. Skipping.")
+                continue
+
+            wax = measure_wax_melt(image)
+            if wax is None:
+                print(f"{filename} - Chamber not detected, skipping.")
+                continue
+
+            for name in ("rect1_thresh", "rect2_thresh"):
+                mask_path = os.path.join(mask_output_folder, f"{os.path.splitext(filename)[0]}_{name}.png")
+                cv2.imwrite(mask_path, wax[name])
+
+            w1, d1 = wax["rect1_percent"]
+            w2, d2 = wax["rect2_percent"]
+            total_white = w1 + w2
+            total_dark = d1 + d2
+
+            # Annotate
+            cx_full, cy_full, cr = wax["chamber"]
+            cv2.circle(image, (cx_full, cy_full), cr, (0, 255, 0), 2)
+            cv2.circle(image, (cx_full, cy_full), 5, (0, 255, 0), -1)
+            cv2.rectangle(image, *wax["rect1"], (255, 255, 0), 2)
+            cv2.rectangle(image, *wax["rect2"], (0, 255, 255), 2)
+
+            annotated_path = os.path.join(output_folder, filename)
+            cv2.imwrite(annotated_path, image)
+
+            csv_writer.writerow([
+                filename,
+                f"{w1:.2f}", f"{d1:.2f}",
+                f"{w2:.2f}", f"{d2:.2f}",
+                f"{total_white:.2f}", f"{total_dark:.2f}"
+            ])
+
+            hist_filenames.append(filename)
+            rect_hists.append((wax["rect1_hist"], wax["rect2_hist"]))
+
+            print(f"{filename} - Rect1: {w1:.1f}%, Rect2: {w2:.1f}% white")
+
+    if hist_filenames:
+        np.savez_compressed(
+            histogram_path,
+            filenames=np.array(hist_filenames),
+            rect_hists=np.array(rect_hists, dtype=np.int64)
+        )
+
+    print(f"\nWax melt analysis done! CSV: {csv_output_path}")
+
+#recompute wax white/dark % for the whole run at a new threshold, without touching the images again
+def rethreshold_wax_run(input_folder, new_threshold):
+    histogram_path = os.path.join(input_folder, "wax_histograms.npz")
+    if not os.path.exists(histogram_path):
+        print(f"No wax histograms in {input_folder} - run process_wax_melt_images first.")
+        return None
+
+    data = np.load(histogram_path)
+    white = white_percent_from_histograms(data["rect_hists"], new_threshold)    # (n_images, 2)
+    dark = 100 - white
+
+    csv_output_path = os.path.join(input_folder, f"wax_analysis_threshold_{int(new_threshold)}.csv")
+    with open(csv_output_path, mode='w', newline='') as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow([
+            'filename',
+            'rect1_white_percent', 'rect1_dark_percent',
+            'rect2_white_percent', 'rect2_dark_percent',
+            'total_white_percent', 'total_dark_percent'
+        ])
+        for filename, (w1, w2), (d1, d2) in zip(data["filenames"], white, dark):
+            csv_writer.writerow([
+                filename,
+                f"{w1:.2f}", f"{d1:.2f}",
+                f"{w2:.2f}", f"{d2:.2f}",
+                f"{w1 + w2:.2f}", f"{d1 + d2:.2f}"
+            ])
+
+    print(f"Wax re-thresholded at {int(new_threshold)} for {len(white)} images. CSV: {csv_output_path}")
+    return csv_output_path